@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Grvt Order Book Feed
+Keeps the latest orderbook snapshot for one instrument in memory:
+  - subscribes to the `book.s` WebSocket stream
+  - optionally forwards the private `order` stream to a callback
+  - runs the asyncio client on a background thread
+Readers get the last snapshot without any network round-trip.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from operator import itemgetter
+from pysdk.grvt_ccxt_env import GrvtEnv, GrvtWSEndpointType
+from pysdk.grvt_ccxt_ws import GrvtCcxtWS
+
+logger = logging.getLogger("grvt.book_feed")
+
+
+# Pulls (price, size) out of a Grvt level dict in one C-level call
+_price_size = itemgetter("price", "size")
+
+
+@dataclass(frozen=True, slots=True)
+class BookSnapshot:
+    """Top of book as (price, size) float tuples, best level first."""
+
+    bids: list[tuple[float, float]]
+    asks: list[tuple[float, float]]
+    # Total size over the parsed levels, summed once at ingest for OBI
+    bid_vol: float
+    ask_vol: float
+    ts: float
+
+
+def parse_levels(levels: list[dict], depth: int) -> list[tuple[float, float]]:
+    """Convert the top `depth` Grvt level dicts to (price, size) float tuples."""
+    return [(float(price), float(size)) for price, size in map(_price_size, levels[:depth])]
+
+
+def parse_book(bids: list[dict] | None, asks: list[dict] | None, levels: int) -> BookSnapshot | None:
+    """Parse the top `levels` of a raw Grvt book once; None if a side is empty."""
+    if not bids or not asks:
+        return None
+    bid_levels = parse_levels(bids, levels)
+    ask_levels = parse_levels(asks, levels)
+    return BookSnapshot(
+        bids=bid_levels,
+        asks=ask_levels,
+        bid_vol=sum(size for _, size in bid_levels),
+        ask_vol=sum(size for _, size in ask_levels),
+        ts=time.monotonic(),
+    )
+
+
+class BookFeed:
+    """Background WebSocket subscription holding the latest book snapshot."""
+
+    def __init__(
+        self,
+        env: GrvtEnv,
+        params: dict,
+        instrument: str,
+        depth: int = 10,
+        levels: int = 5,
+        rate_ms: int = 500,
+        order_callback: Callable[[dict], Awaitable[None]] | None = None,
+    ):
+        self.env = env
+        self.params = params
+        self.instrument = instrument
+        self.depth = depth
+        self.levels = levels
+        self.rate_ms = rate_ms
+        self.order_callback = order_callback
+        self.ws: GrvtCcxtWS | None = None
+        self.latest_book: BookSnapshot | None = None
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="grvt-book-feed", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._subscribe())
+        except Exception as e:
+            logger.error("❌ Book feed failed to start: %s", e)
+            return
+        self._loop.run_forever()
+
+    async def _subscribe(self) -> None:
+        # The websockets client pings every 20s by default, which keeps the
+        # connection alive; the SDK reconnects and resubscribes on its own.
+        self.ws = GrvtCcxtWS(self.env, self._loop, parameters=self.params)
+        await self.ws.initialize()
+        await self.ws.subscribe(
+            stream="book.s",
+            callback=self._on_book,
+            params={"instrument": self.instrument, "rate": self.rate_ms, "depth": self.depth},
+        )
+        if self.order_callback:
+            await self.ws.subscribe(
+                stream="order",
+                callback=self.order_callback,
+                params={"instrument": self.instrument},
+            )
+
+    async def _on_book(self, message: dict) -> None:
+        feed = message.get("feed", {})
+        # Only the top `levels` are ever read, so don't hold on to the rest
+        book = parse_book(feed.get("bids", []), feed.get("asks", []), self.levels)
+        # Snapshots are replaced whole and never mutated, so swapping the
+        # reference is all readers need to see a consistent book.
+        with self._lock:
+            self.latest_book = book
+
+    def snapshot(self, max_age: float = 1.0) -> BookSnapshot | None:
+        """Latest book, or None if nothing newer than `max_age` seconds arrived."""
+        with self._lock:
+            book = self.latest_book
+        if book is None or time.monotonic() - book.ts >= max_age:
+            return None
+        return book
+
+    def orders_live(self) -> bool:
+        """True while the private `order` stream is connected and subscribed."""
+        ws = self.ws
+        return bool(
+            ws
+            and ws.is_connection_open(GrvtWSEndpointType.TRADE_DATA)
+            and ws.is_stream_subscribed(GrvtWSEndpointType.TRADE_DATA, "order")
+        )
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Grvt Order Tracker
+Keeps the set of live client_order_ids locally:
+  - adds ids as orders are placed or reported OPEN
+  - drops ids when the `order` stream reports a terminal state
+Lets the bot check for open orders without a REST poll.
+"""
+
+import threading
+
+# Order states after which an order can no longer rest on the book
+TERMINAL_STATUSES = {"FILLED", "CANCELLED", "REJECTED"}
+
+
+class OrderTracker:
+    """Thread-safe set of open client_order_ids fed by order updates."""
+
+    def __init__(self):
+        self.open_ids: set[str] = set()
+        # Ids already seen closing, so a late add() can't resurrect them
+        self._closed_ids: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.open_ids)
+
+    def add(self, *client_order_ids: str) -> None:
+        with self._lock:
+            for cid in client_order_ids:
+                if cid not in self._closed_ids:
+                    self.open_ids.add(cid)
+
+    def reset(self, client_order_ids) -> None:
+        """Replace the tracked set with a REST snapshot of open orders."""
+        snapshot = set(client_order_ids)
+        with self._lock:
+            # The stream may have closed an order after REST listed it, so
+            # known-closed ids win over the snapshot.
+            self.open_ids = snapshot - self._closed_ids
+            # Ids REST no longer lists are settled; stop remembering them
+            self._closed_ids &= snapshot
+
+    async def on_order(self, message: dict) -> None:
+        """Callback for the `order` WebSocket stream."""
+        order = message.get("feed", {})
+        cid = str(order.get("metadata", {}).get("client_order_id", ""))
+        status = order.get("state", {}).get("status")
+        if not cid or not status:
+            return
+        with self._lock:
+            if status in TERMINAL_STATUSES:
+                self.open_ids.discard(cid)
+                self._closed_ids.add(cid)
+            elif cid not in self._closed_ids:
+                self.open_ids.add(cid)
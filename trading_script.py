@@ -4,22 +4,213 @@ Grvt Bracket Limit Orders Bot (loop version)
 Places two limit orders with filters:
   - BUY below best ask
   - SELL above best bid
-Skips placement if any open orders exist.
+Skips placement if any open orders exist (tracked from the order stream).
+Reads the orderbook from a WebSocket feed (REST fallback when stale).
 Runs in loop with configurable wait and max attempts.
 """
 
+import atexit
+import logging
+import math
 import os
+import queue
+import random
+import sys
+import threading
 import time
-import numpy as np
-from collections import deque
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
 from pysdk.grvt_ccxt import GrvtCcxt
-from pysdk.grvt_ccxt_env import GrvtEnv
+from pysdk.grvt_ccxt_env import GrvtEnv, get_grvt_endpoint
 from dotenv import load_dotenv
+from book_feed import BookFeed, BookSnapshot, parse_book
+from order_tracker import OrderTracker
 
 load_dotenv()
 
-# Rolling window for volatility
-price_window = deque(maxlen=50)
+logger = logging.getLogger("grvt")
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Enqueue records unformatted so the listener thread does the formatting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Args are formatted later on the listener thread, so callers must not
+        # mutate any object they pass to a log call after making it.
+        return record
+
+
+def setup_logging() -> None:
+    """Route the `grvt` loggers through a queue drained by a background thread."""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    listener = QueueListener(log_queue, handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.setLevel(os.getenv("LOGGING_LEVEL", "INFO"))
+    logger.propagate = False
+    listener.start()
+    # Flush whatever is still queued on exit
+    atexit.register(listener.stop)
+
+
+class RollingVolatility:
+    """Std of log-returns over the last `window` mid prices, updated in O(1)."""
+
+    def __init__(self, window: int = 50):
+        # Preallocated ring of unboxed doubles; `head` is the next slot to write
+        self.capacity = window - 1
+        self.logret_window = array("d", [0.0]) * self.capacity
+        self.head = 0
+        self.count = 0
+        self.last_log_mid: float | None = None
+        self.running_sum = 0.0
+        self.running_sumsq = 0.0
+
+    def __len__(self) -> int:
+        """Number of mid prices currently covered by the window."""
+        if self.last_log_mid is None:
+            return 0
+        return self.count + 1
+
+    def append(self, mid: float) -> None:
+        log_mid = math.log(mid)
+        if self.last_log_mid is not None:
+            lr = log_mid - self.last_log_mid
+            if self.count == self.capacity:
+                # Retire the return that slides out of the window
+                evicted = self.logret_window[self.head]
+                self.running_sum -= evicted
+                self.running_sumsq -= evicted * evicted
+            else:
+                self.count += 1
+            self.logret_window[self.head] = lr
+            self.head = (self.head + 1) % self.capacity
+            self.running_sum += lr
+            self.running_sumsq += lr * lr
+        self.last_log_mid = log_mid
+
+    def std(self) -> float:
+        """Population std (ddof=0) of the windowed log-returns."""
+        n = self.count
+        if n == 0:
+            return 0.0
+        mean = self.running_sum / n
+        # Clamp tiny negative values caused by float cancellation
+        return math.sqrt(max(self.running_sumsq / n - mean * mean, 0.0))
+
+
+# Grvt serves book depths of 10/50/100/500 only; 10 is the smallest
+BOOK_DEPTH = 10
+# Levels per side actually consumed (best price + OBI)
+OBI_DEPTH = 5
+
+# Rolling volatility over mids of ticks that passed the spread filter
+tradeable_mid_window = RollingVolatility(window=50)
+
+
+# Sends the BUY and SELL legs in parallel
+order_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="grvt-order")
+
+
+@dataclass(frozen=True, slots=True)
+class FilterConfig:
+    """Pre-trade filter thresholds, read once from the environment."""
+
+    min_spread: float
+    max_spread: float
+    obi_tolerance: float
+    max_volatility: float
+
+
+# Longest single wait after a throttled or failed request
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class RateLimitError(Exception):
+    """The venue throttled us (HTTP 429)."""
+
+    def __init__(self, retry_after: float | None):
+        super().__init__(f"rate limited (retry_after={retry_after})")
+        # Seconds from the Retry-After header, or None if absent/unparseable
+        self.retry_after = retry_after
+
+
+class AuthError(Exception):
+    """The venue rejected our credentials (HTTP 401/403)."""
+
+
+def check_response_status(response: requests.Response, *args, **kwargs) -> None:
+    """requests response hook turning throttling and auth failures into exceptions.
+
+    The SDK swallows non-2xx replies into empty results, which would otherwise
+    surface as unrelated KeyErrors.
+    """
+    if response.status_code not in (401, 403, 429):
+        return
+    # Raising here skips the body read in Session.send; drain it so the
+    # keep-alive connection goes back to the pool.
+    response.content
+    if response.status_code == 429:
+        try:
+            # Cap like backoff_delay so a huge (or inf) header can't stall the bot
+            retry_after = float(response.headers.get("Retry-After"))
+            retry_after = min(max(0.0, retry_after), MAX_BACKOFF_SECONDS)
+        except (TypeError, ValueError):
+            retry_after = None
+        raise RateLimitError(retry_after)
+    raise AuthError(f"HTTP {response.status_code} from {response.url}")
+
+
+def backoff_delay(failures: int) -> float:
+    """Jittered exponential backoff: 100ms doubling per failure, capped at 30s."""
+    # 0.1 * 2**9 already passes the cap; clamping the exponent keeps a long
+    # outage from overflowing the int-to-float conversion.
+    return min(MAX_BACKOFF_SECONDS, 0.1 * 2 ** min(failures, 9)) + random.random() * 0.1
+
+
+def configure_http_session(api: GrvtCcxt, env: GrvtEnv, ping_seconds: float = 20.0) -> None:
+    """Size the SDK's keep-alive pool and keep the order host connections warm."""
+    # GrvtCcxt already reuses one requests.Session; this only applies our
+    # pool size (4 per host, down from the stock adapter's 10).
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    api._session.mount("https://", adapter)
+    api._session.hooks["response"].append(check_response_status)
+
+    # The loop idles WAIT_SECONDS between orders, long enough for the server
+    # to drop an idle connection. Periodic HEADs keep the TLS sockets open
+    # so create_order doesn't pay a new handshake. The pool hands out the
+    # most recently used connection first, so a lone HEAD would only ever
+    # warm one; send one per bracket leg, in flight together on the order
+    # executor, so each checks out its own connection.
+    order_url = urlsplit(get_grvt_endpoint(env, "CREATE_ORDER"))
+    ping_url = f"{order_url.scheme}://{order_url.netloc}/"
+
+    def head():
+        # Best effort: any reply keeps the socket warm, whatever its status
+        try:
+            api._session.head(ping_url, timeout=5)
+        except (requests.RequestException, RateLimitError, AuthError):
+            pass
+
+    def ping():
+        for future in [order_executor.submit(head) for _ in range(2)]:
+            future.result()
+        timer = threading.Timer(ping_seconds, ping)
+        timer.daemon = True
+        timer.start()
+
+    ping()
+
+
+def sleep_from(tick_start: float, period: float) -> None:
+    """Sleep until `period` seconds after `tick_start`, net of time already spent."""
+    time.sleep(max(0.0, period - (time.monotonic() - tick_start)))
 
 
 def get_open_orders(api: GrvtCcxt, symbol: str) -> list[dict]:
@@ -27,63 +218,98 @@ def get_open_orders(api: GrvtCcxt, symbol: str) -> list[dict]:
         symbol=symbol,
         params={"kind": "PERPETUAL"},
     )
-    print(f"open_orders: {open_orders}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("open_orders: %s", open_orders)
     return open_orders
 
 
-def compute_orderbook_imbalance(bids, asks, depth=5):
-    """Compute Order Book Imbalance (OBI)."""
-    bid_vol = sum(float(b["size"]) for b in bids[:depth])
-    ask_vol = sum(float(a["size"]) for a in asks[:depth])
-    if bid_vol + ask_vol == 0:
-        return 0.5
-    return bid_vol / (bid_vol + ask_vol)
+# evaluate_filters() decision codes
+PASS, SKIP_SPREAD, SKIP_OBI, SKIP_VOLATILITY = range(4)
 
+SKIP_MESSAGES = {
+    SKIP_SPREAD: "⏸️ Spread out of range (%.2f), skipping order.",
+    SKIP_OBI: "⏸️ Orderbook imbalanced (OBI=%.2f), skipping order.",
+    SKIP_VOLATILITY: "⏸️ Volatility too high (%.4f), skipping order.",
+}
 
-def place_bracket_limit_orders(
-    api: GrvtCcxt,
-    symbol: str,
-    quantity: float,
-    offset: float,
-    min_spread: float,
-    max_spread: float,
-    obi_tolerance: float,
-    max_volatility: float,
-):
-    instrument = api.markets[symbol]["instrument"]
-    orderbook = api.fetch_order_book(instrument, limit=10)
 
-    asks = orderbook.get("asks")
-    bids = orderbook.get("bids")
-    if not asks or not bids:
-        raise RuntimeError("Orderbook missing asks or bids")
+def evaluate_filters(book: BookSnapshot, filters: FilterConfig) -> tuple[int, float]:
+    """Run the spread, OBI and volatility filters in one pass.
 
-    best_ask = float(asks[0]["price"])
-    best_bid = float(bids[0]["price"])
-    spread = best_ask - best_bid
-    mid = (best_ask + best_bid) / 2
-
-    print(f"Best Bid: ${best_bid:.2f} | Best Ask: ${best_ask:.2f} | Spread: {spread:.2f}")
+    Returns a decision code and the metric that decided it.
+    """
+    best_bid, _ = book.bids[0]
+    best_ask, _ = book.asks[0]
 
     # --- Spread filter ---
-    if not (min_spread <= spread <= max_spread):
-        print(f"⏸️ Spread out of range ({spread:.2f}), skipping order.")
-        return None
+    spread = best_ask - best_bid
+    if not (filters.min_spread <= spread <= filters.max_spread):
+        return SKIP_SPREAD, spread
+
+    # Feed volatility with every tick whose spread is tradeable, whether or
+    # not OBI rejects it, so the estimate tracks the regime we'd trade in.
+    tradeable_mid_window.append((best_ask + best_bid) / 2)
 
     # --- OBI filter ---
-    obi = compute_orderbook_imbalance(bids, asks)
-    if obi < 0.5 - obi_tolerance or obi > 0.5 + obi_tolerance:
-        print(f"⏸️ Orderbook imbalanced (OBI={obi:.2f}), skipping order.")
-        return None
+    total_vol = book.bid_vol + book.ask_vol
+    obi = book.bid_vol / total_vol if total_vol else 0.5
+    if abs(obi - 0.5) > filters.obi_tolerance:
+        return SKIP_OBI, obi
 
     # --- Volatility filter ---
-    price_window.append(mid)
-    if len(price_window) >= 10:
-        log_returns = np.diff(np.log(price_window))
-        vol = np.std(log_returns)
-        if vol > max_volatility:
-            print(f"⏸️ Volatility too high ({vol:.4f}), skipping order.")
-            return None
+    if len(tradeable_mid_window) >= 10:
+        vol = tradeable_mid_window.std()
+        if vol > filters.max_volatility:
+            return SKIP_VOLATILITY, vol
+
+    return PASS, spread
+
+
+def create_bracket_orders(
+    api: GrvtCcxt,
+    symbol: str,
+    quantity: float,
+    buy_price: float,
+    sell_price: float,
+) -> tuple[dict, dict]:
+    """Send the BUY and SELL legs concurrently, overlapping their round-trips."""
+    futures = [
+        order_executor.submit(
+            api.create_order,
+            symbol=symbol, order_type="limit", side=side, amount=quantity, price=price,
+        )
+        for side, price in (("buy", buy_price), ("sell", sell_price))
+    ]
+    return futures[0].result(), futures[1].result()
+
+
+def place_bracket_limit_orders(
+    api: GrvtCcxt,
+    book_feed: BookFeed,
+    symbol: str,
+    instrument: str,
+    quantity: float,
+    offset: float,
+    filters: FilterConfig,
+):
+    orderbook = book_feed.snapshot()
+    if orderbook is None:
+        # WS snapshot missing or stale, fall back to a REST poll
+        raw = api.fetch_order_book(instrument, limit=BOOK_DEPTH)
+        orderbook = parse_book(raw.get("bids"), raw.get("asks"), OBI_DEPTH)
+        if orderbook is None:
+            raise RuntimeError("Orderbook missing asks or bids")
+
+    best_bid, _ = orderbook.bids[0]
+    best_ask, _ = orderbook.asks[0]
+    logger.info(
+        "Best Bid: $%.2f | Best Ask: $%.2f | Spread: %.2f", best_bid, best_ask, best_ask - best_bid
+    )
+
+    code, value = evaluate_filters(orderbook, filters)
+    if code != PASS:
+        logger.info(SKIP_MESSAGES[code], value)
+        return None
 
     # BUY limit below best ask
     buy_price = best_ask - offset
@@ -92,16 +318,9 @@ def place_bracket_limit_orders(
     if buy_price <= 0 or sell_price <= 0:
         raise ValueError(f"Invalid price levels: buy={buy_price}, sell={sell_price}")
 
-    print(f"Placing BUY limit @ ${buy_price:.2f}")
-    buy_resp = api.create_order(
-        symbol=symbol, order_type="limit", side="buy", amount=quantity, price=buy_price
-    )
+    logger.info("Placing BUY limit @ $%.2f | SELL limit @ $%.2f", buy_price, sell_price)
+    buy_resp, sell_resp = create_bracket_orders(api, symbol, quantity, buy_price, sell_price)
     buy_id = buy_resp["metadata"]["client_order_id"]
-
-    print(f"Placing SELL limit @ ${sell_price:.2f}")
-    sell_resp = api.create_order(
-        symbol=symbol, order_type="limit", side="sell", amount=quantity, price=sell_price
-    )
     sell_id = sell_resp["metadata"]["client_order_id"]
 
     return {
@@ -111,6 +330,8 @@ def place_bracket_limit_orders(
 
 
 def main():
+    setup_logging()
+
     # --- Load environment ---
     api_key = os.getenv("GRVT_API_KEY")
     trading_account_id = os.getenv("GRVT_TRADING_ACCOUNT_ID")
@@ -128,51 +349,99 @@ def main():
     env_name = os.getenv("GRVT_ENV", "testnet")
     env = GrvtEnv(env_name)
     api = GrvtCcxt(env, logger=None, parameters=params)
+    configure_http_session(api, env)
 
     # --- Trading parameters ---
     SYMBOL = os.getenv("GRVT_SYMBOL", "BTC_USDT_Perp")
+    # GrvtCcxt loads the market table once in its constructor and never
+    # refreshes it, so this is the only instrument lookup we pay for.
+    if SYMBOL not in api.markets:
+        raise ValueError(f"Unknown symbol {SYMBOL} ({len(api.markets)} markets loaded)")
+    INSTRUMENT = api.markets[SYMBOL]["instrument"]
     QUANTITY = float(os.getenv("GRVT_QUANTITY", "0.001"))
     OFFSET = float(os.getenv("GRVT_OFFSET", "100.0"))
 
     # --- Filters ---
-    MIN_SPREAD = float(os.getenv("GRVT_MIN_SPREAD", "0.5"))
-    MAX_SPREAD = float(os.getenv("GRVT_MAX_SPREAD", "50.0"))
-    OBI_TOLERANCE = float(os.getenv("GRVT_OBI_TOLERANCE", "0.2"))
-    MAX_VOLATILITY = float(os.getenv("GRVT_MAX_VOLATILITY", "0.002"))
+    FILTERS = FilterConfig(
+        min_spread=float(os.getenv("GRVT_MIN_SPREAD", "0.5")),
+        max_spread=float(os.getenv("GRVT_MAX_SPREAD", "50.0")),
+        obi_tolerance=float(os.getenv("GRVT_OBI_TOLERANCE", "0.2")),
+        max_volatility=float(os.getenv("GRVT_MAX_VOLATILITY", "0.002")),
+    )
+
+    # --- Orderbook and order-status feeds ---
+    order_tracker = OrderTracker()
+    book_feed = BookFeed(
+        env, params, INSTRUMENT, depth=BOOK_DEPTH, levels=OBI_DEPTH,
+        order_callback=order_tracker.on_order,
+    )
+    book_feed.start()
 
     # --- Loop settings ---
     MAX_ATTEMPTS = int(os.getenv("GRVT_MAX_ATTEMPTS", "10"))
     WAIT_SECONDS = int(os.getenv("GRVT_WAIT_SECONDS", "60"))
+    RECONCILE_SECONDS = int(os.getenv("GRVT_RECONCILE_SECONDS", "300"))
 
     attempt = 0
+    consecutive_failures = 0
+    last_reconcile = float("-inf")
     while attempt < MAX_ATTEMPTS:
-        print(f"\n🔁 Attempt {attempt + 1}/{MAX_ATTEMPTS}")
+        tick_start = time.monotonic()
+        logger.info("🔁 Attempt %d/%d", attempt + 1, MAX_ATTEMPTS)
 
         try:
+            # 🔄 Reconcile with REST periodically, or whenever the order stream is down
+            if not book_feed.orders_live() or time.monotonic() - last_reconcile >= RECONCILE_SECONDS:
+                open_orders = get_open_orders(api, SYMBOL)
+                order_tracker.reset(o["metadata"]["client_order_id"] for o in open_orders)
+                last_reconcile = time.monotonic()
+
             # 🔍 Skip if any open orders exist
-            open_orders = get_open_orders(api, SYMBOL)
-            if open_orders:
-                print(f"⚠️ {len(open_orders)} open order(s) found. Skipping new orders.")
-                time.sleep(WAIT_SECONDS)
-                continue
-
-            results = place_bracket_limit_orders(
-                api, SYMBOL, QUANTITY, OFFSET,
-                MIN_SPREAD, MAX_SPREAD, OBI_TOLERANCE, MAX_VOLATILITY
-            )
-
-            if results:
-                print(f"✅ BUY {results['buy']['order_id']} @ {results['buy']['price']:.2f}")
-                print(f"✅ SELL {results['sell']['order_id']} @ {results['sell']['price']:.2f}")
-                attempt += 1
-                time.sleep(WAIT_SECONDS)
+            open_count = len(order_tracker)
+            if open_count:
+                logger.info("⚠️ %d open order(s) found. Skipping new orders.", open_count)
+                wait = WAIT_SECONDS
             else:
-                print("⚠️ Order skipped by filters. Retrying soon...")
-                time.sleep(5)
-
+                results = place_bracket_limit_orders(
+                    api, book_feed, SYMBOL, INSTRUMENT, QUANTITY, OFFSET, FILTERS
+                )
+
+                if results:
+                    order_tracker.add(results["buy"]["order_id"], results["sell"]["order_id"])
+                    logger.info("✅ BUY %s @ %.2f", results["buy"]["order_id"], results["buy"]["price"])
+                    logger.info("✅ SELL %s @ %.2f", results["sell"]["order_id"], results["sell"]["price"])
+                    attempt += 1
+                    wait = WAIT_SECONDS
+                else:
+                    logger.info("⚠️ Order skipped by filters. Retrying soon...")
+                    wait = 5
+
+        except AuthError as e:
+            # Credentials won't fix themselves; stop instead of hammering the API
+            logger.error("❌ Authentication rejected, stopping: %s", e)
+            raise
+        except RateLimitError as e:
+            # Never retry sooner than our own backoff, even on Retry-After: 0
+            delay = backoff_delay(consecutive_failures)
+            if e.retry_after is not None:
+                delay = max(e.retry_after, delay)
+            consecutive_failures += 1
+            logger.warning("⏳ Rate limited. Retrying in %.2fs", delay)
+            time.sleep(delay)
+            continue
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = backoff_delay(consecutive_failures)
+            consecutive_failures += 1
+            logger.warning("🌐 Network error: %s. Retrying in %.2fs", e, delay)
+            time.sleep(delay)
+            continue
         except Exception as e:
-            print(f"❌ Error: {e}")
-            time.sleep(10)
+            logger.error("❌ Error: %s", e)
+            sleep_from(tick_start, 10)
+            continue
+
+        consecutive_failures = 0
+        sleep_from(tick_start, wait)
 
 
 if __name__ == "__main__":